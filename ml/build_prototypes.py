@@ -4,17 +4,44 @@
 from __future__ import annotations
 
 import argparse
-import json
+import os
 import uuid
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
+from functools import lru_cache, partial
 from pathlib import Path
 from typing import Dict, Iterable, List, Optional
 
 import librosa
 import numpy as np
+import orjson
 import soundfile as sf
 from tqdm import tqdm
 
+try:  # torch is optional; it is only needed for the batched GPU STFT path
+    import torch
+except ImportError:  # pragma: no cover - exercised on CPU-only installs
+    torch = None
+
+try:  # numba is optional; without it the NumPy implementations are used
+    from numba import njit
+except ImportError:  # pragma: no cover - exercised when numba is not installed
+    njit = None
+
+N_FFT = 2048
+# Only the time-averaged spectrum is used, so frames need not overlap: the average is
+# insensitive to framing and non-overlapping frames halve the number of FFTs.
+HOP_LENGTH = N_FFT
+# Block length of the energy envelope used for onset detection (512 samples at 44.1 kHz). It is
+# set in time rather than samples so the onset rate means the same at every sample rate.
+ONSET_BLOCK = 512 / 44_100
+# Peak-picking windows (seconds) as in librosa.onset.onset_detect, plus the minimum rise of an
+# onset over its local mean, in nats of log-energy flux. The envelope is not min-max normalised
+# like librosa's: on stationary noise that would scale random fluctuations up to full height.
+ONSET_WAIT = 0.03
+ONSET_AVG = 0.10
+ONSET_DELTA = 0.7
+
 
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Generate prototype embeddings for drone audio")
@@ -22,6 +49,16 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument("--output", required=True, type=Path, help="Output JSON path for prototypes")
     parser.add_argument("--category-map", type=Path, default=None, help="Optional YAML/JSON describing category metadata")
     parser.add_argument("--sample-rate", type=int, default=44_100, help="Target sample rate when loading audio")
+    parser.add_argument(
+        "--device",
+        choices=("auto", "cpu", "cuda"),
+        default="auto",
+        help="Where to run the STFT; 'cuda' batches files through torch.stft (auto picks cuda when available)",
+    )
+    parser.add_argument("--batch-size", type=int, default=16, help="Number of files per batched GPU STFT pass")
+    parser.add_argument(
+        "--workers", type=int, default=os.cpu_count() or 1, help="Worker processes for decoding and feature extraction"
+    )
     return parser.parse_args()
 
 
@@ -56,6 +93,204 @@ def list_audio_files(root: Path) -> Iterable[Path]:
             yield path
 
 
+def resolve_device(requested: str) -> str:
+    if requested == "auto":
+        return "cuda" if torch is not None and torch.cuda.is_available() else "cpu"
+    if requested == "cuda" and (torch is None or not torch.cuda.is_available()):
+        raise RuntimeError("--device cuda requested but torch with CUDA support is not available")
+    return requested
+
+
+def load_waveform(wav_path: Path, sample_rate: int) -> np.ndarray:
+    """Load a file as a mono float32 waveform at ``sample_rate``."""
+    try:
+        waveform, sr = sf.read(wav_path, dtype="float32")
+    except RuntimeError:
+        waveform, sr = librosa.load(wav_path, sr=sample_rate, mono=True)
+
+    waveform = np.asarray(waveform, dtype=np.float32)
+    if waveform.ndim > 1:
+        waveform = librosa.to_mono(waveform.T)
+
+    if sr != sample_rate:
+        waveform = librosa.resample(waveform, orig_sr=sr, target_sr=sample_rate)
+    return waveform
+
+
+@lru_cache(maxsize=None)
+def frequency_axis(sample_rate: int) -> np.ndarray:
+    """STFT bin frequencies for ``sample_rate``; cached and read-only since every file shares it."""
+    freqs = librosa.fft_frequencies(sr=sample_rate, n_fft=N_FFT)
+    freqs.setflags(write=False)
+    return freqs
+
+
+def average_spectrum(waveform: np.ndarray) -> np.ndarray:
+    """Time-averaged STFT magnitude of a normalised mono waveform."""
+    stft = librosa.stft(waveform, n_fft=N_FFT, hop_length=HOP_LENGTH, dtype=np.complex64)
+    return np.mean(np.abs(stft), axis=1)
+
+
+def batched_average_spectra(waveforms: List[np.ndarray], device: str) -> List[np.ndarray]:
+    """Compute ``average_spectrum`` for several waveforms in a single torch.stft pass.
+
+    Waveforms are peak-normalised and zero-padded to a common length. Frames that only
+    exist because of the padding are masked out of the time average, so each result
+    matches what ``average_spectrum`` produces for the unpadded waveform.
+    """
+    tensors = []
+    for waveform in waveforms:
+        tensor = torch.from_numpy(np.ascontiguousarray(waveform, dtype=np.float32))
+        peak = tensor.abs().max()
+        if peak > 0:
+            tensor = tensor / peak
+        tensors.append(tensor)
+
+    batch = torch.nn.utils.rnn.pad_sequence(tensors, batch_first=True).to(device)
+    window = torch.hann_window(N_FFT, device=device)
+    stft = torch.stft(
+        batch,
+        n_fft=N_FFT,
+        hop_length=HOP_LENGTH,
+        window=window,
+        center=True,
+        pad_mode="constant",
+        return_complex=True,
+    )
+    magnitude = stft.abs()
+
+    frame_counts = torch.tensor([1 + len(w) // HOP_LENGTH for w in waveforms], device=device)
+    valid = torch.arange(magnitude.shape[-1], device=device)[None, :] < frame_counts[:, None]
+    spectra = (magnitude * valid[:, None, :]).sum(dim=-1) / frame_counts[:, None]
+    return list(spectra.cpu().numpy())
+
+
+def onset_hop(sample_rate: int) -> int:
+    """Samples per ``ONSET_BLOCK`` block at ``sample_rate``."""
+    return max(1, round(ONSET_BLOCK * sample_rate))
+
+
+def onset_envelope(power: np.ndarray, sample_rate: int) -> np.ndarray:
+    """Positive log-energy flux between consecutive ``ONSET_BLOCK`` blocks of ``power``."""
+    hop = onset_hop(sample_rate)
+    blocks = power.size // hop
+    block_energy = power[: blocks * hop].reshape(blocks, hop).mean(axis=1)
+    return np.maximum(0.0, np.diff(np.log(block_energy + 1e-10)))
+
+
+def count_onsets(onset_env: np.ndarray, sample_rate: int) -> int:
+    """Count onsets in ``onset_env`` with librosa's peak-picking rules and ``ONSET_DELTA``."""
+    if onset_env.size == 0:
+        return 0
+    frame_rate = sample_rate / onset_hop(sample_rate)
+    wait = int(ONSET_WAIT * frame_rate)
+    avg = int(ONSET_AVG * frame_rate)
+    onsets = librosa.util.peak_pick(
+        onset_env, pre_max=wait, post_max=1, pre_avg=avg, post_avg=avg + 1,
+        delta=ONSET_DELTA, wait=wait,
+    )
+    return len(onsets)
+
+
+def _jit(func):
+    """Compile ``func`` with numba when it is installed, otherwise return it unchanged."""
+    return njit(cache=True, fastmath=True)(func) if njit is not None else func
+
+
+@_jit
+def _harmonic_features_kernel(
+    magnitude: np.ndarray, fundamental_freq: float, sample_rate: float
+) -> tuple[float, float, float]:
+    """Single-pass loop version of ``compute_harmonic_features`` for numba."""
+    n = magnitude.shape[0]
+    total_energy = 0.0
+    total_mag = 0.0
+    max_possible_mag = 0.0
+    for i in range(n):
+        m = magnitude[i]
+        total_energy += m * m
+        total_mag += m
+        if m > max_possible_mag:
+            max_possible_mag = m
+    if total_energy == 0.0:
+        return 0.0, 0.0, 0.0
+
+    avg_mag = total_mag / n
+    has_peak = False
+    for i in range(1, n - 1):
+        m = magnitude[i]
+        if m > magnitude[i - 1] and m > magnitude[i + 1] and m > avg_mag * 1.2:
+            has_peak = True
+            break
+    if not has_peak:
+        return 0.0, 0.0, 0.0
+
+    freq_resolution = sample_rate / (n * 2.0)
+    tolerance = fundamental_freq * 0.1
+    search_window = max(1, min(10, int(tolerance / freq_resolution)))
+
+    harmonic_energy = 0.0
+    harmonic_total = 0.0
+    harmonic_found = 0
+    for h in range(1, 11):
+        target_freq = fundamental_freq * h
+        if target_freq >= sample_rate / 2:
+            break
+        target_bin = int(target_freq / freq_resolution)
+        if target_bin >= n:
+            break
+
+        start_bin = max(0, target_bin - search_window)
+        end_bin = min(n - 1, target_bin + search_window)
+        max_mag = magnitude[start_bin]
+        for j in range(start_bin + 1, end_bin + 1):
+            if magnitude[j] > max_mag:
+                max_mag = magnitude[j]
+
+        if max_mag > avg_mag * 1.5:
+            harmonic_energy += max_mag * max_mag
+            harmonic_total += max_mag
+            harmonic_found += 1
+
+    harmonic_ratio = harmonic_energy / total_energy
+    harmonic_count = min(1.0, harmonic_found / 10.0)
+    harmonic_strength = 0.0
+    if harmonic_found > 0 and max_possible_mag > 0:
+        harmonic_strength = (harmonic_total / harmonic_found) / max_possible_mag
+    return harmonic_ratio, harmonic_count, harmonic_strength
+
+
+@_jit
+def _am_depth_kernel(waveform: np.ndarray, coef: float) -> float:
+    """Pre-emphasis, rectification and mean/std of the envelope fused into one pass."""
+    n = waveform.shape[0]
+    prev = waveform[0]
+    total = 0.0
+    total_sq = 0.0
+    for i in range(n):
+        x = waveform[i]
+        env = abs(x - coef * prev)
+        prev = x
+        total += env
+        total_sq += env * env
+    mean_env = total / n
+    std_env = np.sqrt(max(0.0, total_sq / n - mean_env * mean_env))
+    return min(1.0, std_env / (mean_env + 1e-9))
+
+
+def amplitude_modulation_depth(waveform: np.ndarray, coef: float = 0.97) -> float:
+    """Ratio of envelope variability to its mean for the pre-emphasised waveform (0-1)."""
+    if waveform.size == 0:
+        return 0.0
+
+    if njit is not None:
+        return float(_am_depth_kernel(np.ascontiguousarray(waveform), float(coef)))
+
+    previous = np.concatenate((waveform[:1], waveform[:-1]))
+    env = np.abs(waveform - coef * previous)
+    return float(min(1.0, np.std(env) / (np.mean(env) + 1e-9)))
+
+
 def compute_harmonic_features(
     magnitude: np.ndarray, freqs: np.ndarray, fundamental_freq: float, sample_rate: int
 ) -> tuple[float, float, float]:
@@ -63,20 +298,21 @@ def compute_harmonic_features(
     if len(magnitude) == 0 or fundamental_freq <= 0:
         return 0.0, 0.0, 0.0
 
+    if njit is not None:
+        return _harmonic_features_kernel(
+            np.ascontiguousarray(magnitude, dtype=np.float64), float(fundamental_freq), float(sample_rate)
+        )
+
     # Calculate total energy
-    total_energy = float(np.sum(magnitude ** 2))
+    total_energy = float(np.dot(magnitude, magnitude))
     if total_energy == 0:
         return 0.0, 0.0, 0.0
 
-    # Find peaks
-    peaks = []
+    # Find peaks: local maxima that rise above 1.2x the average magnitude
     avg_mag = float(np.mean(magnitude))
-    for i in range(1, len(magnitude) - 1):
-        if magnitude[i] > magnitude[i - 1] and magnitude[i] > magnitude[i + 1]:
-            if magnitude[i] > avg_mag * 1.2:
-                peaks.append(i)
-
-    if len(peaks) == 0:
+    centre = magnitude[1:-1]
+    is_peak = (centre > magnitude[:-2]) & (centre > magnitude[2:]) & (centre > avg_mag * 1.2)
+    if not is_peak.any():
         return 0.0, 0.0, 0.0
 
     # Calculate frequency resolution
@@ -84,32 +320,23 @@ def compute_harmonic_features(
 
     # Find harmonics of the fundamental frequency
     max_harmonic = 10
-    harmonic_energy = 0.0
-    harmonic_magnitudes = []
     tolerance = fundamental_freq * 0.1  # 10% tolerance
 
-    for h in range(1, max_harmonic + 1):
-        target_freq = fundamental_freq * float(h)
-        if target_freq >= sample_rate / 2:
-            break
-
-        # Find the bin closest to the target harmonic frequency
-        target_bin = int(target_freq / freq_resolution)
-        if target_bin >= len(magnitude):
-            break
+    # Harmonics below Nyquist whose closest bin falls inside the spectrum
+    target_freqs = fundamental_freq * np.arange(1, max_harmonic + 1, dtype=float)
+    target_bins = (target_freqs / freq_resolution).astype(int)
+    in_range = (target_freqs < sample_rate / 2) & (target_bins < len(magnitude))
+    target_bins = target_bins[np.cumprod(in_range).astype(bool)]
 
-        # Search in a small window around the expected harmonic
-        search_window = max(1, min(10, int(tolerance / freq_resolution)))
-        start_bin = max(0, target_bin - search_window)
-        end_bin = min(len(magnitude) - 1, target_bin + search_window)
+    # Maximum in a small window around each expected harmonic (clipped to the spectrum edges)
+    search_window = max(1, min(10, int(tolerance / freq_resolution)))
+    offsets = np.arange(-search_window, search_window + 1)
+    window_bins = np.clip(target_bins[:, None] + offsets, 0, len(magnitude) - 1)
+    window_max = magnitude[window_bins].max(axis=1)
 
-        # Find maximum in the search window
-        max_mag = float(np.max(magnitude[start_bin : end_bin + 1]))
-
-        # Harmonic must be at least 1.5x the average magnitude
-        if max_mag > avg_mag * 1.5:
-            harmonic_energy += max_mag * max_mag
-            harmonic_magnitudes.append(max_mag)
+    # Harmonic must be at least 1.5x the average magnitude
+    harmonic_magnitudes = window_max[window_max > avg_mag * 1.5]
+    harmonic_energy = float(np.sum(harmonic_magnitudes * harmonic_magnitudes))
 
     # Calculate harmonic ratio
     harmonic_ratio = harmonic_energy / total_energy if total_energy > 0 else 0.0
@@ -128,80 +355,94 @@ def compute_harmonic_features(
     return harmonic_ratio, harmonic_count, harmonic_strength
 
 
-def compute_feature_vector(waveform: np.ndarray, sample_rate: int) -> List[float]:
+def compute_feature_vector(
+    waveform: np.ndarray, sample_rate: int, avg_spectrum: Optional[np.ndarray] = None
+) -> List[float]:
+    """Extract the 19-dimensional feature vector for a waveform.
+
+    ``avg_spectrum`` may be supplied when the time-averaged STFT magnitude has already
+    been computed in a batch (see ``batched_average_spectra``).
+    """
+    # float32 halves the memory traffic through the STFT and every derived array
+    waveform = waveform.astype(np.float32, copy=False)
     if waveform.ndim > 1:
         waveform = librosa.to_mono(waveform.T)
 
-    waveform = librosa.util.normalize(waveform)
-    rms = float(np.sqrt(np.mean(waveform**2)))
-    zcr = float(np.mean(librosa.feature.zero_crossing_rate(waveform)))
+    # Level features are taken before peak normalisation (as the Go extractor does);
+    # afterwards the RMS would only measure the crest factor of the clip.
+    power = waveform * waveform
+    rms = float(np.sqrt(np.mean(power)))
     variance = float(np.var(waveform))
 
-    n_fft = 2048
-    hop_length = n_fft // 2
-    stft = librosa.stft(waveform, n_fft=n_fft, hop_length=hop_length)
-    magnitude = np.abs(stft)
-    freq_axis = librosa.fft_frequencies(sr=sample_rate, n_fft=n_fft)
-    avg_spectrum = np.mean(magnitude, axis=1)
+    peak = float(np.max(np.abs(waveform))) if waveform.size else 0.0
+    if peak > 0:
+        waveform = waveform / peak
+    zcr = float(np.mean(librosa.feature.zero_crossing_rate(waveform)))
+
+    if avg_spectrum is None:
+        avg_spectrum = average_spectrum(waveform)
+    freq_axis = frequency_axis(sample_rate)
 
-    spectral_centroid = float(np.sum(freq_axis * avg_spectrum) / (np.sum(avg_spectrum) + 1e-12))
+    # One reduction of the spectrum feeds every energy-weighted feature below
+    spectrum_sum = float(np.sum(avg_spectrum))
+    spectrum_total = spectrum_sum + 1e-12
+    mean_spectrum = spectrum_sum / avg_spectrum.size
+    prob = avg_spectrum / spectrum_total
+
+    spectral_centroid = float(np.dot(freq_axis, prob))
     
     # Re-implementing Go's version of these features
     
     # Spectral Bandwidth
+    # Deviation powers are shared with the skewness/kurtosis moments below
     deviation = freq_axis - spectral_centroid
-    spectral_bandwidth = float(np.sqrt(np.sum(avg_spectrum * deviation * deviation) / (np.sum(avg_spectrum) + 1e-12)))
+    deviation_sq = deviation * deviation
+    weighted_dev2 = prob * deviation_sq
+    spectral_bandwidth = float(np.sqrt(np.sum(weighted_dev2)))
 
     # Spectral Rolloff
-    total_energy = np.sum(avg_spectrum)
-    target_energy = 0.85 * total_energy
-    cumulative_energy = np.cumsum(avg_spectrum)
-    rolloff_index = np.searchsorted(cumulative_energy, target_energy)
+    rolloff_index = np.searchsorted(np.cumsum(prob), 0.85)
     spectral_rolloff = float(freq_axis[rolloff_index]) if rolloff_index < len(freq_axis) else float(freq_axis[-1])
 
-    # Spectral Flatness
-    log_mag = np.log(avg_spectrum + 1e-12)
-    geometric_mean = np.exp(np.mean(log_mag))
-    arithmetic_mean = np.mean(avg_spectrum)
-    spectral_flatness = float(geometric_mean / (arithmetic_mean + 1e-12))
+    # Spectral Flatness (the log spectrum is shared with the entropy below)
+    log_spectrum = np.log(avg_spectrum + 1e-12)
+    geometric_mean = np.exp(np.mean(log_spectrum))
+    spectral_flatness = float(geometric_mean / (mean_spectrum + 1e-12))
     
-    # Spectral Entropy
-    prob = avg_spectrum / (np.sum(avg_spectrum) + 1e-12)
-    entropy = float(-np.sum(prob * np.log2(prob + 1e-12)) / np.log2(len(prob)))
+    # Spectral Entropy: log(prob) = log(spectrum) - log(total), so no second log pass is needed.
+    # The log base cancels in the normalisation, so natural logs are used throughout.
+    entropy = float(-np.dot(prob, log_spectrum - np.log(spectrum_total)) / np.log(len(prob)))
 
-    crest_factor = float(np.max(avg_spectrum) / (np.mean(avg_spectrum) + 1e-12))
+    crest_factor = float(np.max(avg_spectrum) / (mean_spectrum + 1e-12))
 
     dominant_index = int(np.argmax(avg_spectrum))
     dominant_frequency = float(freq_axis[dominant_index])
     
     # Temporal features from Go implementation
-    # These require operating on the original waveform
-    temporal_centroid_val = np.sum(np.arange(len(waveform)) * (waveform**2)) / (np.sum(waveform**2) + 1e-12) / len(waveform)
-
-    # Simplified onset rate for Python
-    onset_env = librosa.onset.onset_detect(y=waveform, sr=sample_rate, units='time')
-    onset_rate_val = len(onset_env) / (len(waveform) / sample_rate)
+    # These require operating on the original waveform (the centroid is scale-invariant,
+    # so the pre-normalisation power can be reused)
+    temporal_centroid_val = np.dot(np.arange(len(waveform)), power) / (np.sum(power) + 1e-12) / len(waveform)
+
+    # Simplified onset rate for Python: peaks in the short-block energy flux. This is
+    # taken in the time domain because non-overlapping STFT frames smear out transients.
+    onset_count = count_onsets(onset_envelope(power, sample_rate), sample_rate)
+    onset_rate_val = onset_count / (len(waveform) / sample_rate)
     onset_rate_norm = min(1.0, onset_rate_val / 20.0) # Normalize by max 20 onsets/sec
 
     # Amplitude modulation depth
-    env = np.abs(librosa.effects.preemphasis(waveform))
-    mean_env = np.mean(env)
-    std_env = np.std(env)
-    am_depth_val = min(1.0, std_env / (mean_env + 1e-9))
+    am_depth_val = amplitude_modulation_depth(waveform)
     
     # Spectral Shape features from Go
     # Skewness
-    third_moment = np.sum(avg_spectrum * ((freq_axis - spectral_centroid) ** 3)) / (np.sum(avg_spectrum) + 1e-12)
+    third_moment = np.dot(weighted_dev2, deviation)
     skewness_val = np.tanh(third_moment / ((spectral_bandwidth ** 3) + 1e-12))
 
     # Kurtosis
-    fourth_moment = np.sum(avg_spectrum * ((freq_axis - spectral_centroid) ** 4)) / (np.sum(avg_spectrum) + 1e-12)
+    fourth_moment = np.dot(weighted_dev2, deviation_sq)
     kurtosis_val = max(0, (fourth_moment / ((spectral_bandwidth ** 4) + 1e-12)) / 3.0)
 
     # Peak Prominence
-    sorted_peaks = np.sort(avg_spectrum)
-    top_peaks_avg = np.mean(sorted_peaks[-3:])
-    mean_spectrum = np.mean(avg_spectrum)
+    top_peaks_avg = float(np.partition(avg_spectrum, -3)[-3:].mean())
     peak_prominence_val = (top_peaks_avg - mean_spectrum) / (top_peaks_avg + mean_spectrum + 1e-9)
     peak_prominence_val = max(0, min(1, peak_prominence_val))
 
@@ -253,6 +494,40 @@ def compute_feature_vector(waveform: np.ndarray, sample_rate: int) -> List[float
     return vector.round(6).tolist()
 
 
+def build_prototype(
+    wav_path: Path,
+    waveform: np.ndarray,
+    avg_spectrum: Optional[np.ndarray],
+    sample_rate: int,
+    metadata: Dict[str, LabelMetadata],
+) -> Dict[str, object]:
+    label = wav_path.parent.name
+    label_meta = metadata.get(label, LabelMetadata())
+    if label_meta.extra is None:
+        label_meta.extra = {}
+    if label_meta.description and "description" not in label_meta.extra:
+        label_meta.extra["description"] = label_meta.description
+
+    features = compute_feature_vector(waveform, sample_rate, avg_spectrum)
+    proto_id = f"proto_{label}_{uuid.uuid4().hex[:8]}"
+
+    return {
+        "id": proto_id,
+        "label": label,
+        "category": label_meta.category,
+        "description": label_meta.description,
+        "source": str(wav_path),
+        "features": features,
+        "metadata": label_meta.extra,
+    }
+
+
+def process_file(wav_path: Path, sample_rate: int, metadata: Dict[str, LabelMetadata]) -> Dict[str, object]:
+    """Load one file and build its prototype; runs inside a worker process."""
+    waveform = load_waveform(wav_path, sample_rate)
+    return build_prototype(wav_path, waveform, None, sample_rate, metadata)
+
+
 def build_prototypes(args: argparse.Namespace) -> None:
     metadata = load_metadata(args.category_map)
 
@@ -261,46 +536,31 @@ def build_prototypes(args: argparse.Namespace) -> None:
     if not files:
         raise RuntimeError(f"No wav files found under {input_root}")
 
+    device = resolve_device(args.device)
+    batch_size = max(1, args.batch_size)
+
     prototypes = []
-    for wav_path in tqdm(files, desc="Extracting features"):
-        try:
-            waveform, sr = sf.read(wav_path)
-        except RuntimeError:
-            waveform, sr = librosa.load(wav_path, sr=args.sample_rate, mono=True)
-
-        if sr != args.sample_rate:
-            waveform = librosa.resample(
-                waveform.T if isinstance(waveform, np.ndarray) and waveform.ndim > 1 else waveform,
-                orig_sr=sr,
-                target_sr=args.sample_rate,
-            )
-            sr = args.sample_rate
-
-        label = wav_path.parent.name
-        label_meta = metadata.get(label, LabelMetadata())
-        if label_meta.extra is None:
-            label_meta.extra = {}
-        if label_meta.description and "description" not in label_meta.extra:
-            label_meta.extra["description"] = label_meta.description
-
-        features = compute_feature_vector(np.asarray(waveform, dtype=float), sr)
-        proto_id = f"proto_{label}_{uuid.uuid4().hex[:8]}"
-
-        prototypes.append(
-            {
-                "id": proto_id,
-                "label": label,
-                "category": label_meta.category,
-                "description": label_meta.description,
-                "source": str(wav_path),
-                "features": features,
-                "metadata": label_meta.extra,
-            }
-        )
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as executor, tqdm(
+        total=len(files), desc="Extracting features"
+    ) as progress:
+        if device == "cuda":
+            # Decode in the pool, then run the STFT for the whole batch on the GPU
+            load = partial(load_waveform, sample_rate=args.sample_rate)
+            for start in range(0, len(files), batch_size):
+                batch_paths = files[start : start + batch_size]
+                waveforms = list(executor.map(load, batch_paths))
+                spectra = batched_average_spectra(waveforms, device)
+                for wav_path, waveform, spectrum in zip(batch_paths, waveforms, spectra):
+                    prototypes.append(build_prototype(wav_path, waveform, spectrum, args.sample_rate, metadata))
+                progress.update(len(batch_paths))
+        else:
+            process = partial(process_file, sample_rate=args.sample_rate, metadata=metadata)
+            for prototype in executor.map(process, files):
+                prototypes.append(prototype)
+                progress.update()
 
     args.output.parent.mkdir(parents=True, exist_ok=True)
-    with args.output.open("w", encoding="utf-8") as handle:
-        json.dump(prototypes, handle, indent=2)
+    args.output.write_bytes(orjson.dumps(prototypes, option=orjson.OPT_INDENT_2))
 
     print(f"Wrote {len(prototypes)} prototypes to {args.output}")
 
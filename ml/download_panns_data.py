@@ -7,10 +7,31 @@ This script manually downloads the required files using Python's requests librar
 """
 
 import os
+import shutil
 import sys
 import requests
 from pathlib import Path
 
+class ProgressReader:
+    """File-like wrapper that reports download progress every few MB"""
+    
+    def __init__(self, raw, total_size, report_every=5 * 1024 * 1024):
+        self.raw = raw
+        self.total_size = total_size
+        self.report_every = report_every
+        self.downloaded = 0
+        self.last_reported = 0
+    
+    def read(self, size=-1):
+        chunk = self.raw.read(size)
+        self.downloaded += len(chunk)
+        if self.total_size > 0 and (not chunk or self.downloaded - self.last_reported >= self.report_every):
+            self.last_reported = self.downloaded
+            percent = (self.downloaded / self.total_size) * 100
+            print(f"  Progress: {percent:.1f}%", end='\r')
+        return chunk
+
+
 def download_file(url, dest_path):
     """Download a file with progress indication"""
     print(f"Downloading {os.path.basename(dest_path)}...")
@@ -18,19 +39,13 @@ def download_file(url, dest_path):
     try:
         response = requests.get(url, stream=True)
         response.raise_for_status()
+        # Let urllib3 undo any gzip/deflate transfer encoding while we read raw
+        response.raw.decode_content = True
         
         total_size = int(response.headers.get('content-length', 0))
-        block_size = 8192
-        downloaded = 0
         
         with open(dest_path, 'wb') as f:
-            for chunk in response.iter_content(block_size):
-                if chunk:
-                    f.write(chunk)
-                    downloaded += len(chunk)
-                    if total_size > 0:
-                        percent = (downloaded / total_size) * 100
-                        print(f"  Progress: {percent:.1f}%", end='\r')
+            shutil.copyfileobj(ProgressReader(response.raw, total_size), f, length=1024 * 1024)
         
         print(f"\n  ✓ Downloaded to {dest_path}")
         return True
@@ -9,16 +9,24 @@ Install:
     pip install panns-inference torch librosa flask
 """
 
+import io
 import os
 import sys
+import tempfile
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 import numpy as np
 import librosa
+import orjson
+import soundfile as sf
 import torch
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from panns_inference import AudioTagging
-import tempfile
 import logging
 
+SAMPLE_RATE = 32000  # PANNS models are trained on 32 kHz mono audio
+
 app = Flask(__name__)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -37,30 +45,172 @@ except Exception as e:
     logger.error(f"Failed to load PANNS model: {e}")
     at = None
 
+# Compile Cnn14 so its conv/BN chains run as fused kernels on CUDA. torch.compile is lazy, so
+# the service warms the model up before serving (see warm_up_model). Uploads vary in length, so
+# shapes are compiled as dynamic and CUDA graphs (mode='reduce-overhead') are avoided: those
+# record a new graph per input length and grow memory without bound in a long-running server.
+# Dynamic shapes are still guarded on a few length ranges from the conv output sizes; all clips
+# longer than ~3.5 s share one graph. Set PANNS_TORCH_COMPILE=0 to run the model eagerly.
+model_compiled = False
+if at is not None:
+    at.model.eval()
+    if device == 'cuda' and os.environ.get('PANNS_TORCH_COMPILE', '1') != '0':
+        # AudioTagging wraps Cnn14 in DataParallel on CUDA; compile the inner model itself
+        # (inputs are already moved to the device in run_model)
+        core = getattr(at.model, 'module', at.model)
+        at.model = torch.compile(core, dynamic=True)
+        model_compiled = True
+        logger.info("PANNS model wrapped with torch.compile (compiles on warm-up)")
+
+
+def load_audio(audio_path):
+    """
+    Load an audio file as a mono waveform at the PANNS sample rate
+    
+    Decoded audio is cached next to the source as <filename>.32000.npy and reused while it
+    is newer than the source file, so repeated prototype rebuilds skip the decode and
+    resample. Set PANNS_AUDIO_CACHE=0 to disable the cache.
+    """
+    source = Path(audio_path)
+    # Keep the source extension in the key so clip.wav and clip.mp3 don't share a cache file
+    cache_path = source.with_name(f'{source.name}.{SAMPLE_RATE}.npy')
+    use_cache = os.environ.get('PANNS_AUDIO_CACHE', '1') != '0'
+    
+    if use_cache and cache_path.exists() and cache_path.stat().st_mtime >= source.stat().st_mtime:
+        return np.load(cache_path)
+    
+    # librosa handles multiple formats
+    audio, _ = librosa.load(audio_path, sr=SAMPLE_RATE, mono=True)
+    
+    if use_cache:
+        # Write via a temp file so an interrupted run never leaves a truncated cache behind
+        tmp_path = cache_path.with_name(cache_path.name + '.tmp')
+        try:
+            with open(tmp_path, 'wb') as f:
+                np.save(f, audio)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            logger.warning(f"Could not cache decoded audio for {audio_path}: {e}")
+    
+    return audio
+
 
-def embed_audio_panns(audio_path):
+def load_audio_from_bytes(data):
     """
-    Generate PANNS embedding from audio file
+    Decode an in-memory audio file (e.g. an upload) as a mono 32 kHz waveform
+    
+    Formats libsndfile reads (WAV, FLAC, OGG, MP3, ...) are decoded without touching disk.
+    Anything else (m4a/aac, ...) falls back to librosa.load on a temporary file, since
+    librosa only tries audioread for paths, not file-like objects.
+    """
+    try:
+        audio, sr = sf.read(io.BytesIO(data), dtype='float32')
+    except sf.LibsndfileError:
+        with tempfile.NamedTemporaryFile(delete=False) as tmp:
+            tmp.write(data)
+            tmp_path = tmp.name
+        try:
+            audio, _ = librosa.load(tmp_path, sr=SAMPLE_RATE, mono=True)
+        finally:
+            os.unlink(tmp_path)
+        return audio
+    if audio.ndim > 1:
+        audio = librosa.to_mono(audio.T)
+    if sr != SAMPLE_RATE:
+        audio = librosa.resample(audio, orig_sr=sr, target_sr=SAMPLE_RATE, res_type='soxr_hq')
+    return audio
+
+
+def run_model(batch):
+    """Run Cnn14 on a (B, T) batch of waveforms and return the (B, 2048) embeddings"""
+    audio = torch.from_numpy(np.ascontiguousarray(batch, dtype=np.float32))
+    if device == 'cuda':
+        audio = audio.pin_memory().to(device, non_blocking=True)
+    
+    # inference_mode skips autograd bookkeeping entirely (stricter than no_grad)
+    with torch.inference_mode():
+        output = at.model(audio, None)
+    return output['embedding'].cpu().numpy()
+
+
+def warm_up_model():
+    """Run dummy inferences so torch.compile compiles before the first request arrives"""
+    # Dynamic shapes still specialise on a batch size of 1, so compile both the single
+    # clip (/embed) and the multi-clip (/embed/batch) graphs, at a length in the open-ended
+    # range that covers every clip longer than ~3.5 s
+    for batch_size in (1, 2):
+        run_model(np.zeros((batch_size, 5 * SAMPLE_RATE), dtype=np.float32))
+
+
+def embed_waveforms(waveforms, batch_size=16):
+    """
+    Generate PANNS embeddings for several waveforms, batching the model calls
+    
+    Only clips of equal length share a batch: Cnn14 pools over time, so zero
+    padding a shorter clip would change its embedding.
     
     Args:
-        audio_path: Path to audio file (WAV, MP3, etc.)
+        waveforms: List of mono 32 kHz numpy arrays
+        batch_size: Maximum number of clips per inference call
         
     Returns:
-        numpy array of shape (2048,) containing the embedding
+        List of numpy arrays of shape (2048,), in the same order as waveforms
     """
     if at is None:
         raise RuntimeError("PANNS model not loaded")
     
-    # Load audio with librosa (handles multiple formats)
-    audio, sr = librosa.load(audio_path, sr=32000, mono=True)
+    indices_by_length = defaultdict(list)
+    for index, audio in enumerate(waveforms):
+        indices_by_length[len(audio)].append(index)
+    
+    embeddings = [None] * len(waveforms)
+    for indices in indices_by_length.values():
+        for start in range(0, len(indices), batch_size):
+            chunk = indices[start:start + batch_size]
+            batch = np.stack([waveforms[i] for i in chunk])
+            batch_embeddings = run_model(batch)
+            for index, embedding in zip(chunk, batch_embeddings):
+                embeddings[index] = embedding
     
-    # Add batch dimension
-    audio = audio[np.newaxis, :]
+    return embeddings
+
+
+def embed_audio_panns(audio):
+    """
+    Generate PANNS embedding from an audio file or waveform
+    
+    Args:
+        audio: Path to audio file (WAV, MP3, etc.) or a mono 32 kHz numpy array
+        
+    Returns:
+        numpy array of shape (2048,) containing the embedding
+    """
+    if not isinstance(audio, np.ndarray):
+        audio = load_audio(audio)
+    return embed_waveforms([audio])[0]
+
+
+def embed_audio_panns_batch(audio_paths, batch_size=16):
+    """
+    Generate PANNS embeddings for several audio files
     
-    # Get embeddings (returns tuple of clipwise_output and embedding)
-    _, embedding = at.inference(audio)
+    Files are decoded in a thread pool, then run through the model in batches.
     
-    return embedding[0]  # Return first (and only) embedding
+    Args:
+        audio_paths: List of paths to audio files
+        batch_size: Maximum number of clips per inference call
+        
+    Returns:
+        List of numpy arrays of shape (2048,), in the same order as audio_paths
+    """
+    with ThreadPoolExecutor() as pool:
+        waveforms = list(pool.map(load_audio, audio_paths))
+    return embed_waveforms(waveforms, batch_size)
+
+
+def numpy_json_response(payload):
+    """JSON response that serialises numpy arrays natively instead of via .tolist()"""
+    return Response(orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY), mimetype='application/json')
 
 
 @app.route('/health', methods=['GET'])
@@ -90,42 +240,21 @@ def embed():
     try:
         # Handle file upload
         if 'audio' in request.files:
-            audio_file = request.files['audio']
-            
-            # Save to temporary file
-            with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as tmp:
-                audio_file.save(tmp.name)
-                tmp_path = tmp.name
-            
-            try:
-                embedding = embed_audio_panns(tmp_path)
-                return jsonify({
-                    'embedding': embedding.tolist(),
-                    'dimension': len(embedding)
-                })
-            finally:
-                os.unlink(tmp_path)
+            audio_data = request.files['audio'].read()
         
         # Handle base64 audio data
         elif request.json and 'audio_data' in request.json:
             import base64
             audio_data = base64.b64decode(request.json['audio_data'])
-            
-            with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as tmp:
-                tmp.write(audio_data)
-                tmp_path = tmp.name
-            
-            try:
-                embedding = embed_audio_panns(tmp_path)
-                return jsonify({
-                    'embedding': embedding.tolist(),
-                    'dimension': len(embedding)
-                })
-            finally:
-                os.unlink(tmp_path)
         
         else:
             return jsonify({'error': 'No audio file or audio_data provided'}), 400
+        
+        embedding = embed_audio_panns(load_audio_from_bytes(audio_data))
+        return numpy_json_response({
+            'embedding': embedding,
+            'dimension': len(embedding)
+        })
             
     except Exception as e:
         logger.error(f"Embedding generation failed: {e}", exc_info=True)
@@ -148,22 +277,18 @@ def embed_batch():
         if not files:
             return jsonify({'error': 'No audio files provided'}), 400
         
-        embeddings = []
-        for audio_file in files:
-            with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as tmp:
-                audio_file.save(tmp.name)
-                tmp_path = tmp.name
-            
-            try:
-                embedding = embed_audio_panns(tmp_path)
-                embeddings.append({
-                    'filename': audio_file.filename,
-                    'embedding': embedding.tolist()
-                })
-            finally:
-                os.unlink(tmp_path)
+        waveforms = [load_audio_from_bytes(audio_file.read()) for audio_file in files]
+        batch_embeddings = embed_waveforms(waveforms)
+        
+        embeddings = [
+            {
+                'filename': audio_file.filename,
+                'embedding': embedding
+            }
+            for audio_file, embedding in zip(files, batch_embeddings)
+        ]
         
-        return jsonify({
+        return numpy_json_response({
             'embeddings': embeddings,
             'count': len(embeddings)
         })
@@ -178,6 +303,11 @@ if __name__ == '__main__':
         logger.error("PANNS model failed to load. Exiting.")
         sys.exit(1)
     
+    if model_compiled:
+        logger.info("Warming up compiled PANNS model...")
+        warm_up_model()
+        logger.info("PANNS model warm-up complete")
+    
     port = int(os.environ.get('EMBEDDING_SERVICE_PORT', 5002))
     logger.info(f"Starting PANNS embedding service on port {port}")
     app.run(host='0.0.0.0', port=port, debug=False)
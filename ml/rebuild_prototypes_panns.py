@@ -12,12 +12,12 @@ Usage:
 
 import os
 import sys
-import json
 import argparse
 import glob
 from pathlib import Path
-from embedding_service import embed_audio_panns, at
-import hashlib
+import orjson
+from embedding_service import embed_audio_panns, embed_audio_panns_batch, at
+import secrets
 
 
 def generate_prototype_id(label):
@@ -30,7 +30,7 @@ def generate_prototype_id(label):
         safe_label = "prototype"
     
     # Add random suffix
-    random_hex = hashlib.md5(os.urandom(8)).hexdigest()[:8]
+    random_hex = secrets.token_hex(4)
     return f"proto_{safe_label}_{random_hex}"
 
 
@@ -41,7 +41,21 @@ def infer_label_from_directory(dir_path):
     return label.strip()
 
 
-def process_directory(root_dir, category="drone"):
+def embed_files(audio_paths, batch_size):
+    """Embed a batch of files, falling back to one-by-one so a bad file only fails itself"""
+    try:
+        return embed_audio_panns_batch(audio_paths, batch_size)
+    except Exception:
+        embeddings = []
+        for audio_path in audio_paths:
+            try:
+                embeddings.append(embed_audio_panns(audio_path))
+            except Exception as e:
+                embeddings.append(e)
+        return embeddings
+
+
+def process_directory(root_dir, category="drone", batch_size=16):
     """Process all subdirectories and generate prototypes"""
     print(f"Processing directory: {root_dir}")
     
@@ -71,13 +85,18 @@ def process_directory(root_dir, category="drone"):
         
         print(f"  Found {len(audio_files)} audio files")
         
-        for i, audio_path in enumerate(sorted(audio_files), 1):
-            try:
+        audio_files = sorted(audio_files)
+        for start in range(0, len(audio_files), batch_size):
+            batch = audio_files[start:start + batch_size]
+            embeddings = embed_files(batch, batch_size)
+            
+            for i, (audio_path, embedding) in enumerate(zip(batch, embeddings), start + 1):
                 filename = os.path.basename(audio_path)
                 print(f"  [{i}/{len(audio_files)}] Processing {filename}...", end=" ")
                 
-                # Generate embedding
-                embedding = embed_audio_panns(audio_path)
+                if isinstance(embedding, Exception):
+                    print(f"✗ ERROR: {embedding}")
+                    continue
                 
                 # Create prototype
                 prototype = {
@@ -86,15 +105,11 @@ def process_directory(root_dir, category="drone"):
                     "category": category,
                     "description": f"{label} from {filename}",
                     "source": audio_path,
-                    "features": embedding.tolist()
+                    "features": embedding  # serialised directly by orjson
                 }
                 
                 all_prototypes.append(prototype)
                 print("✓")
-                
-            except Exception as e:
-                print(f"✗ ERROR: {e}")
-                continue
     
     return all_prototypes
 
@@ -104,6 +119,7 @@ def main():
     parser.add_argument('--dir', required=True, help='Root directory containing subdirectories of audio files')
     parser.add_argument('--out', required=True, help='Output JSON file path')
     parser.add_argument('--category', default='drone', help='Category for all prototypes (default: drone)')
+    parser.add_argument('--batch-size', type=int, default=16, help='Audio clips per PANNS inference call (default: 16)')
     
     args = parser.parse_args()
     
@@ -117,7 +133,7 @@ def main():
     print()
     
     # Process directories
-    prototypes = process_directory(args.dir, args.category)
+    prototypes = process_directory(args.dir, args.category, max(1, args.batch_size))
     
     if not prototypes:
         print("\nERROR: No prototypes were created")
@@ -126,8 +142,8 @@ def main():
     # Write output
     os.makedirs(os.path.dirname(args.out), exist_ok=True)
     
-    with open(args.out, 'w') as f:
-        json.dump(prototypes, f, indent=2)
+    with open(args.out, 'wb') as f:
+        f.write(orjson.dumps(prototypes, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
     
     print(f"\n✓ Successfully created {len(prototypes)} prototypes in {args.out}")
     
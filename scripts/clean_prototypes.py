@@ -4,63 +4,116 @@ Remove prototypes with zero harmonic features from prototypes.json
 This allows you to re-upload them with proper feature extraction.
 """
 
-import json
+import os
+import mmap
 import argparse
+from itertools import islice
+
+import numpy as np
+import orjson
+
+try:
+    import ijson
+except ImportError:  # Fall back to parsing the whole file at once
+    ijson = None
 
 EXPECTED_FEATURE_COUNT = 19
+CHUNK_SIZE = 4096  # Prototypes classified per vectorised pass
+
+def has_zero_harmonic_features(feature_lists):
+    """Return a boolean mask marking feature vectors whose harmonic features (last 3) are zeros."""
+    sized = np.fromiter((len(f) == EXPECTED_FEATURE_COUNT for f in feature_lists),
+                        dtype=bool, count=len(feature_lists))
+    zero = np.ones(len(feature_lists), dtype=bool)  # Wrong dimension counts as zero
+    if sized.any():
+        feats = np.array([f for f, ok in zip(feature_lists, sized) if ok], dtype=np.float64)
+        # Check last 3 features (harmonic descriptors)
+        zero[sized] = ~np.any(feats[:, -3:] != 0, axis=1)
+    return zero
+
+def load_prototypes(input_file):
+    """Parse a prototypes file straight from a read-only memory map (no str copy)."""
+    with open(input_file, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        with memoryview(mm) as view:
+            return orjson.loads(view)
+
+def iter_prototypes(input_file):
+    """Yield prototypes one at a time, streaming them with ijson when it is installed."""
+    if ijson is None:
+        yield from load_prototypes(input_file)
+        return
+    with open(input_file, 'rb') as f:
+        yield from ijson.items(f, 'item', use_float=True)
 
-def has_zero_harmonic_features(features):
-    """Check if harmonic features (last 3) are zeros."""
-    if len(features) != EXPECTED_FEATURE_COUNT:
-        return True  # Wrong dimension
-    # Check last 3 features (harmonic descriptors)
-    harmonic_features = features[-3:]
-    return all(f == 0 for f in harmonic_features)
+def write_prototypes(prototypes, output_file, compact=False):
+    """Stream prototypes to a JSON array one item at a time; returns how many were written.
+    
+    Output goes to a temporary file that replaces output_file at the end, so the input
+    can safely be rewritten in place while it is still being streamed. The default layout
+    matches json.dump(indent=2), but orjson formats some floats differently (0.00005188912636955312
+    rather than 5.188912636955312e-05), so the output parses to the same values without being
+    byte-identical. With compact=True the array is written without indentation, which is
+    smaller and faster to produce."""
+    if compact:
+        option, first_sep, sep, end = None, b'', b',', b']'
+    else:
+        option, first_sep, sep, end = orjson.OPT_INDENT_2, b'\n  ', b',\n  ', b'\n]'
+    tmp_file = f"{output_file}.tmp"
+    count = 0
+    with open(tmp_file, 'wb') as f:
+        f.write(b'[')
+        for proto in prototypes:
+            f.write(sep if count else first_sep)
+            item = orjson.dumps(proto, option=option)
+            # Nest each item's indented encoding one level inside the array
+            f.write(item if compact else item.replace(b'\n', b'\n  '))
+            count += 1
+        f.write(end if count else b']')
+    os.replace(tmp_file, output_file)
+    return count
 
-def remove_zero_harmonic_prototypes(input_file, output_file=None, dry_run=False):
+def remove_zero_harmonic_prototypes(input_file, output_file=None, dry_run=False, compact=False):
     """Remove prototypes that have zeros for harmonic features (last 3 features)."""
     
     if output_file is None:
         output_file = input_file
     
-    with open(input_file, 'r') as f:
-        prototypes = json.load(f)
-    
-    original_count = len(prototypes)
-    kept = []
     removed = []
     
-    for proto in prototypes:
-        features = proto.get('features', [])
-        
-        if has_zero_harmonic_features(features):
-            removed.append({
-                'id': proto.get('id'),
-                'label': proto.get('label'),
-                'source': proto.get('source', 'unknown')
-            })
-        else:
-            kept.append(proto)
+    def kept_prototypes():
+        protos = iter_prototypes(input_file)
+        while chunk := list(islice(protos, CHUNK_SIZE)):
+            zero = has_zero_harmonic_features([proto.get('features', []) for proto in chunk])
+            for proto, is_zero in zip(chunk, zero):
+                if is_zero:
+                    # Only the summary fields are kept for removed prototypes
+                    removed.append((proto.get('id'), proto.get('label'), proto.get('source', 'unknown')))
+                else:
+                    yield proto
+    
+    if dry_run:
+        kept_count = sum(1 for _ in kept_prototypes())
+    else:
+        kept_count = write_prototypes(kept_prototypes(), output_file, compact)
+    original_count = kept_count + len(removed)
     
     print(f"Original prototypes: {original_count}")
-    print(f"Keeping: {len(kept)}")
+    print(f"Keeping: {kept_count}")
     print(f"Removing: {len(removed)}")
     
     if removed:
         print(f"\nPrototypes to be removed (re-upload these):")
-        for item in removed:
-            print(f"  - {item['id']}: {item['label']} (source: {item['source']})")
+        for proto_id, label, source in removed:
+            print(f"  - {proto_id}: {label} (source: {source})")
     
     if not dry_run:
-        with open(output_file, 'w') as f:
-            json.dump(kept, f, indent=2)
         print(f"\n✅ Saved cleaned prototypes to {output_file}")
         print(f"   You can now re-upload the removed prototypes via the web interface.")
     else:
         print(f"\n⚠️  DRY RUN - no changes made")
         print(f"   Run without --dry-run to actually remove them")
     
-    return kept, removed
+    return kept_count, removed
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Remove prototypes with zero harmonic features')
@@ -68,7 +121,8 @@ if __name__ == '__main__':
                        help='Input prototypes.json file')
     parser.add_argument('--output', '-o', help='Output file (default: overwrite input)')
     parser.add_argument('--dry-run', action='store_true', help='Show what would be removed without making changes')
+    parser.add_argument('--compact', action='store_true', help='Write the output without indentation')
     args = parser.parse_args()
     
-    remove_zero_harmonic_prototypes(args.input, args.output, args.dry_run)
+    remove_zero_harmonic_prototypes(args.input, args.output, args.dry_run, args.compact)
 
@@ -10,6 +10,8 @@ This script downloads various types of non-drone sounds to help reduce false pos
 
 Requirements:
     pip install requests pydub
+    pip install av   # Optional: decode in-process instead of running ffmpeg per file
+    pip install requests-cache   # Optional: cache API responses between runs
 
 Setup:
     1. Get a free API key from https://freesound.org/apiv2/apply/
@@ -21,22 +23,44 @@ import os
 import sys
 import time
 import json
+import wave
+import shutil
+import threading
 import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from urllib.parse import urlencode
 
 try:
     import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
 except ImportError:
     print("ERROR: 'requests' library not found")
     print("Install with: pip install requests")
     sys.exit(1)
 
+try:
+    from requests_cache import CachedSession, DO_NOT_CACHE
+except ImportError:  # API responses are fetched fresh every run
+    CachedSession = None
+
+try:
+    import av
+    import numpy as np
+except ImportError:  # Fall back to converting with the ffmpeg binary
+    av = None
+
 # Configuration
 OUTPUT_DIR = Path("train_data_noise")
 SAMPLES_PER_CATEGORY = 5  # Adjust this to download more samples
 SAMPLE_DURATION_MIN = 3   # Minimum duration in seconds
 SAMPLE_DURATION_MAX = 20  # Maximum duration in seconds
+WAV_SAMPLE_RATE = 44100   # Output WAV sample rate (mono, 16-bit)
+MAX_WORKERS = 8           # Categories downloaded concurrently
+API_REQUESTS_PER_MINUTE = 60  # Freesound API rate limit
+CACHE_PATH = ".freesound_cache"  # Only used when requests-cache is installed
+CACHE_EXPIRE_SECONDS = 24 * 60 * 60
 
 # Sound categories to download
 SOUND_CATEGORIES = {
@@ -99,15 +123,66 @@ SOUND_CATEGORIES = {
 }
 
 
+class RateLimiter:
+    """Thread-safe token bucket: allows short bursts, refills at a steady rate."""
+    
+    def __init__(self, per_minute, burst=MAX_WORKERS):
+        self.interval = 60.0 / per_minute
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def acquire(self):
+        """Block until a request may be made."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) / self.interval)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) * self.interval
+            time.sleep(wait)
+    
+    def release(self):
+        """Return a token for a request that never reached the server (e.g. a cache hit)."""
+        with self.lock:
+            self.tokens = min(self.capacity, self.tokens + 1)
+
+
 class FreesoundDownloader:
     def __init__(self, api_key):
         self.api_key = api_key
         self.base_url = "https://freesound.org/apiv2"
-        self.session = requests.Session()
+        if CachedSession is not None:
+            # Cache API responses (searches, sound details) but never the audio previews
+            self.session = CachedSession(
+                CACHE_PATH,
+                expire_after=CACHE_EXPIRE_SECONDS,
+                urls_expire_after={"freesound.org/apiv2/*": CACHE_EXPIRE_SECONDS, "*": DO_NOT_CACHE},
+            )
+        else:
+            self.session = requests.Session()
         self.session.headers.update({"Authorization": f"Token {api_key}"})
+        # Reuse connections across worker threads and retry transient/rate-limit errors
+        retry = Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+        adapter = HTTPAdapter(pool_connections=MAX_WORKERS, pool_maxsize=2 * MAX_WORKERS,
+                              max_retries=retry)
+        self.session.mount("https://", adapter)
+        self.rate_limiter = RateLimiter(API_REQUESTS_PER_MINUTE)
         
-    def search_sounds(self, query, max_results=10):
-        """Search for sounds matching a query."""
+    def api_get(self, url):
+        """GET an API URL, counting it against the rate limit unless it was served from cache."""
+        self.rate_limiter.acquire()
+        response = self.session.get(url, timeout=10)
+        if getattr(response, "from_cache", False):
+            self.rate_limiter.release()
+        return response
+    
+    def search_sounds(self, query, log, max_results=10):
+        """Search for sounds matching a query; errors are appended to log."""
         params = {
             "query": query,
             "filter": f"duration:[{SAMPLE_DURATION_MIN} TO {SAMPLE_DURATION_MAX}]",
@@ -119,21 +194,21 @@ class FreesoundDownloader:
         url = f"{self.base_url}/search/text/?" + urlencode(params)
         
         try:
-            response = self.session.get(url, timeout=10)
+            response = self.api_get(url)
             response.raise_for_status()
             data = response.json()
             return data.get("results", [])
         except requests.RequestException as e:
-            print(f"  ⚠️  Search error: {e}")
+            log.append(f"  ⚠️  Search error: {e}")
             return []
     
-    def download_sound(self, sound_id, output_path):
-        """Download a sound by ID."""
+    def download_sound(self, sound_id, output_path, log):
+        """Download a sound by ID; errors are appended to log."""
         # Get sound details
         url = f"{self.base_url}/sounds/{sound_id}/"
         
         try:
-            response = self.session.get(url, timeout=10)
+            response = self.api_get(url)
             response.raise_for_status()
             sound_data = response.json()
             
@@ -143,36 +218,62 @@ class FreesoundDownloader:
                 preview_url = sound_data.get("previews", {}).get("preview-lq-ogg")
             
             if not preview_url:
-                print(f"  ⚠️  No preview available for sound {sound_id}")
+                log.append(f"  ⚠️  No preview available for sound {sound_id}")
                 return False
             
-            # Download the preview
-            audio_response = self.session.get(preview_url, timeout=30)
-            audio_response.raise_for_status()
-            
-            # Save as OGG temporarily
+            # Stream the preview to a temporary OGG file without buffering it in memory
             temp_ogg = output_path.with_suffix(".ogg")
-            temp_ogg.write_bytes(audio_response.content)
-            
-            # Convert to WAV using ffmpeg
-            if self.convert_to_wav(temp_ogg, output_path):
-                temp_ogg.unlink()  # Delete temporary OGG file
-                return True
-            else:
-                temp_ogg.unlink()
-                return False
+            try:
+                with self.session.get(preview_url, stream=True, timeout=30) as audio_response:
+                    audio_response.raise_for_status()
+                    audio_response.raw.decode_content = True
+                    with open(temp_ogg, "wb") as fh:
+                        shutil.copyfileobj(audio_response.raw, fh, length=1 << 16)
+                
+                # Convert to WAV in-process with PyAV, or with ffmpeg
+                if av is not None:
+                    return self.decode_to_wav(temp_ogg, output_path, log)
+                return self.convert_to_wav(temp_ogg, output_path, log)
+            finally:
+                temp_ogg.unlink(missing_ok=True)  # Delete temporary OGG file
                 
         except requests.RequestException as e:
-            print(f"  ⚠️  Download error: {e}")
+            log.append(f"  ⚠️  Download error: {e}")
             return False
     
-    def convert_to_wav(self, input_file, output_file):
+    def decode_to_wav(self, input_file, output_file, log):
+        """Decode audio in-process with PyAV and write it as 44.1kHz mono 16-bit WAV."""
+        try:
+            resampler = av.audio.resampler.AudioResampler(format="s16", layout="mono", rate=WAV_SAMPLE_RATE)
+            chunks = []
+            with av.open(str(input_file)) as container:
+                if not container.streams.audio:
+                    log.append(f"  ⚠️  Decode error: no audio stream in {input_file}")
+                    return False
+                for frame in container.decode(audio=0):
+                    chunks.extend(f.to_ndarray().reshape(-1) for f in resampler.resample(frame))
+            chunks.extend(f.to_ndarray().reshape(-1) for f in resampler.resample(None))  # Flush
+            samples = np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.int16)
+            
+            with wave.open(str(output_file), "wb") as wav:
+                wav.setnchannels(1)
+                wav.setsampwidth(2)
+                wav.setframerate(WAV_SAMPLE_RATE)
+                wav.writeframes(samples.astype("<i2", copy=False).tobytes())
+            return True
+            
+        except (av.error.FFmpegError, OSError, ValueError) as e:
+            log.append(f"  ⚠️  Decode error: {e}")
+            Path(output_file).unlink(missing_ok=True)
+            return False
+    
+    def convert_to_wav(self, input_file, output_file, log):
         """Convert audio file to WAV format using ffmpeg."""
         try:
             cmd = [
                 "ffmpeg",
                 "-i", str(input_file),
-                "-ar", "44100",      # Sample rate: 44.1kHz
+                "-ar", str(WAV_SAMPLE_RATE),  # Sample rate: 44.1kHz
                 "-ac", "1",          # Mono
                 "-sample_fmt", "s16", # 16-bit
                 "-y",                # Overwrite output file
@@ -183,19 +284,19 @@ class FreesoundDownloader:
             result = subprocess.run(cmd, capture_output=True, text=True)
             
             if result.returncode != 0:
-                print(f"  ⚠️  ffmpeg error: {result.stderr}")
+                log.append(f"  ⚠️  ffmpeg error: {result.stderr}")
                 return False
             
             return True
             
         except FileNotFoundError:
-            print("  ⚠️  ffmpeg not found. Please install ffmpeg:")
-            print("     macOS: brew install ffmpeg")
-            print("     Linux: sudo apt install ffmpeg")
-            print("     Windows: Download from https://ffmpeg.org/")
+            log.append("  ⚠️  ffmpeg not found. Please install ffmpeg:")
+            log.append("     macOS: brew install ffmpeg")
+            log.append("     Linux: sudo apt install ffmpeg")
+            log.append("     Windows: Download from https://ffmpeg.org/")
             return False
         except Exception as e:
-            print(f"  ⚠️  Conversion error: {e}")
+            log.append(f"  ⚠️  Conversion error: {e}")
             return False
 
 
@@ -213,6 +314,70 @@ def check_ffmpeg():
         return False
 
 
+def download_category(downloader, category, queries, seen_ids, seen_lock):
+    """Download samples for one category; returns (downloaded, failed, log lines).
+    
+    seen_ids is shared across categories (guarded by seen_lock) so no sound is fetched twice."""
+    log = [f"📂 Category: {category}", "-" * 70]
+    
+    category_dir = OUTPUT_DIR / category
+    category_dir.mkdir(exist_ok=True)
+    
+    downloaded_count = 0
+    failed_count = 0
+    
+    for query in queries:
+        if downloaded_count >= SAMPLES_PER_CATEGORY:
+            break
+        
+        log.append(f"  🔍 Searching: '{query}'")
+        
+        # Search for sounds
+        sounds = downloader.search_sounds(query, log, max_results=3)
+        
+        if not sounds:
+            log.append(f"     No sounds found")
+            continue
+        
+        # Try to download the first available sound
+        for sound in sounds:
+            if downloaded_count >= SAMPLES_PER_CATEGORY:
+                break
+            
+            sound_id = sound["id"]
+            with seen_lock:
+                if sound_id in seen_ids:
+                    continue  # Already handled by another query or category
+                seen_ids.add(sound_id)
+            sound_name = sound["name"]
+            duration = sound["duration"]
+            
+            # Create filename
+            safe_name = "".join(c if c.isalnum() or c in "._- " else "_" for c in sound_name)
+            safe_name = safe_name[:50]  # Limit length
+            filename = f"{category}_{downloaded_count+1:02d}_{safe_name}.wav"
+            output_path = category_dir / filename
+            
+            # Skip if already exists
+            if output_path.exists():
+                log.append(f"     ⏭️  Already exists: {filename}")
+                downloaded_count += 1
+                break
+            
+            log.append(f"     ⬇️  Downloading: {sound_name} ({duration:.1f}s)")
+            
+            # Download and convert
+            if downloader.download_sound(sound_id, output_path, log):
+                log.append(f"     ✅ Saved: {filename}")
+                downloaded_count += 1
+                break
+            else:
+                failed_count += 1
+    
+    log.append(f"  ✅ Downloaded {downloaded_count}/{SAMPLES_PER_CATEGORY} for {category}")
+    return downloaded_count, failed_count, log
+
+
 def main():
     print("=" * 70)
     print("Freesound Noise Sample Downloader")
@@ -234,11 +399,11 @@ def main():
         print("   FREESOUND_API_KEY='your-key' python download_noise_samples.py")
         sys.exit(1)
     
-    # Check for ffmpeg
-    if not check_ffmpeg():
+    # Check for ffmpeg (only needed when PyAV isn't installed)
+    if av is None and not check_ffmpeg():
         print("❌ ERROR: ffmpeg not found")
         print()
-        print("Please install ffmpeg:")
+        print("Please install PyAV (pip install av) or ffmpeg:")
         print("  macOS:   brew install ffmpeg")
         print("  Linux:   sudo apt install ffmpeg")
         print("  Windows: Download from https://ffmpeg.org/")
@@ -258,67 +423,21 @@ def main():
     total_downloaded = 0
     total_failed = 0
     
-    # Download samples for each category
-    for category, queries in SOUND_CATEGORIES.items():
-        print(f"📂 Category: {category}")
-        print("-" * 70)
-        
-        category_dir = OUTPUT_DIR / category
-        category_dir.mkdir(exist_ok=True)
-        
-        downloaded_count = 0
-        
-        for query in queries:
-            if downloaded_count >= SAMPLES_PER_CATEGORY:
-                break
-            
-            print(f"  🔍 Searching: '{query}'")
-            
-            # Search for sounds
-            sounds = downloader.search_sounds(query, max_results=3)
-            
-            if not sounds:
-                print(f"     No sounds found")
-                continue
-            
-            # Try to download the first available sound
-            for sound in sounds:
-                if downloaded_count >= SAMPLES_PER_CATEGORY:
-                    break
-                
-                sound_id = sound["id"]
-                sound_name = sound["name"]
-                duration = sound["duration"]
-                
-                # Create filename
-                safe_name = "".join(c if c.isalnum() or c in "._- " else "_" for c in sound_name)
-                safe_name = safe_name[:50]  # Limit length
-                filename = f"{category}_{downloaded_count+1:02d}_{safe_name}.wav"
-                output_path = category_dir / filename
-                
-                # Skip if already exists
-                if output_path.exists():
-                    print(f"     ⏭️  Already exists: {filename}")
-                    downloaded_count += 1
-                    total_downloaded += 1
-                    break
-                
-                print(f"     ⬇️  Downloading: {sound_name} ({duration:.1f}s)")
-                
-                # Download and convert
-                if downloader.download_sound(sound_id, output_path):
-                    print(f"     ✅ Saved: {filename}")
-                    downloaded_count += 1
-                    total_downloaded += 1
-                    time.sleep(1)  # Rate limiting
-                    break
-                else:
-                    total_failed += 1
-            
-            time.sleep(0.5)  # Small delay between searches
-        
-        print(f"  ✅ Downloaded {downloaded_count}/{SAMPLES_PER_CATEGORY} for {category}")
-        print()
+    seen_ids = set()
+    seen_lock = threading.Lock()
+    
+    # Download categories concurrently; each category's log is printed once it finishes
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = [
+            executor.submit(download_category, downloader, category, queries, seen_ids, seen_lock)
+            for category, queries in SOUND_CATEGORIES.items()
+        ]
+        for future in as_completed(futures):
+            downloaded, failed, log = future.result()
+            print("\n".join(log))
+            print()
+            total_downloaded += downloaded
+            total_failed += failed
     
     # Summary
     print("=" * 70)